@@ -0,0 +1,57 @@
+from typing import Optional, List, Dict, Tuple
+import pathlib
+import orjson
+
+# Language tables are computed once here and shared by main.py and translators.py.
+# gtts_langs.json is a frozen copy of tts_langs() so every worker boots with the
+# same list without asking gTTS. Regenerate it after upgrading gTTS:
+#   python -c "from gtts.lang import tts_langs; import json; print(json.dumps(tts_langs(), indent=2, sort_keys=True, ensure_ascii=False))" > gtts_langs.json
+GTTS_LANGS_FILE = pathlib.Path(__file__).with_name("gtts_langs.json")
+
+def load_gtts_langs() -> Dict[str, str]:
+    try:
+        return orjson.loads(GTTS_LANGS_FILE.read_bytes())
+    except FileNotFoundError:
+        from gtts.lang import tts_langs
+        return tts_langs()
+
+GTTS_LANGS = load_gtts_langs()
+
+LANG_CODE_MAP = {
+    "zh": "zh-CN",
+    "pt": "pt",
+    "he": "iw",
+}
+
+def compute_supported_targets() -> List[Dict[str, str]]:
+    return [{"code": code, "tts_code": code, "name": name}
+            for code, name in sorted(GTTS_LANGS.items())]
+
+def build_resolver() -> Dict[str, Tuple[Optional[str], str]]:
+    # code -> (tts_code, display name), covering both gTTS codes and mapped aliases
+    resolver = {code: (code, name) for code, name in GTTS_LANGS.items()}
+    for code, mapped in LANG_CODE_MAP.items():
+        if code not in resolver and mapped in GTTS_LANGS:
+            resolver[code] = (mapped, GTTS_LANGS[mapped])
+    return resolver
+
+RESOLVER = build_resolver()
+
+def pick_tts_code(target_lang: str) -> Optional[str]:
+    entry = RESOLVER.get(target_lang)
+    return entry[0] if entry else None
+
+# Case-insensitive view of RESOLVER for user-supplied codes ("zh-cn" -> "zh-CN").
+CANONICAL_CODES = {code.lower(): code for code in RESOLVER}
+
+def normalize_source(code: Optional[str]) -> str:
+    # Unknown or missing source codes fall back to auto-detection.
+    return CANONICAL_CODES.get((code or "").strip().lower(), "auto")
+
+def code_to_lang_name(code: str) -> str:
+    entry = RESOLVER.get(code)
+    return entry[1] if entry else code
+
+SUPPORTED = compute_supported_targets()
+SUPPORTED_CODES = frozenset(item["code"] for item in SUPPORTED)
+ORJSON_LANGS = orjson.dumps({"languages": SUPPORTED})
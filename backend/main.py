@@ -1,35 +1,93 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple, AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from collections import OrderedDict
 import os
-import uuid
-import tempfile
-import requests
+import re
+import json
+import time
+import asyncio
+import concurrent.futures
+import base64
+import hashlib
+import httpx
+import orjson
 from dotenv import load_dotenv
 from gtts import gTTS
-from gtts.lang import tts_langs
-from openai import OpenAI
+from openai import AsyncOpenAI
+
+import translators
+from translators import CircuitOpenError
+from languages import pick_tts_code, normalize_source, SUPPORTED_CODES, ORJSON_LANGS
 
 # ========= Setup =========
 load_dotenv()
 
-TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY", "").strip()
-API_URL = "https://api.together.xyz/v1/chat/completions"
-MODEL_NAME = "mistralai/Mixtral-8x7B-Instruct-v0.1"
-
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")  # required for /transcribe
 
-if not TOGETHER_API_KEY:
-    print("WARNING: TOGETHER_API_KEY not set in .env file")
 if not OPENAI_API_KEY:
     print("WARNING: OPENAI_API_KEY not set. /transcribe will fail")
 
-# ✅ OpenAI client for Whisper
-client = OpenAI()
+# Clients are created in the lifespan so each uvicorn worker process gets its
+# own connection pools on its own event loop.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared async HTTP client for the translation backend and Google TTS (keeps connections alive across requests)
+    app.state.http_client = httpx.AsyncClient(
+        timeout=60,
+        http2=True,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=50),
+    )
+    # ✅ OpenAI client for Whisper
+    app.state.openai = AsyncOpenAI() if OPENAI_API_KEY else None
+    # Dedicated pool for the remaining blocking TTS work (gTTS text tokenizing and
+    # file I/O) so bursts don't compete with Starlette's shared threadpool.
+    app.state.tts_pool = concurrent.futures.ThreadPoolExecutor(max_workers=64, thread_name_prefix="tts")
+    app.state.tts_cache_lock = asyncio.Lock()
+    app.state.tts_fetch_limit = asyncio.Semaphore(TTS_FETCH_CONCURRENCY)
+    await translators.BACKEND.start(app.state.http_client)
+    cleanup_task = asyncio.create_task(tts_cleanup_loop())
+    yield
+    cleanup_task.cancel()
+    await translators.BACKEND.close()
+    await app.state.http_client.aclose()
+    if app.state.openai:
+        await app.state.openai.close()
+    app.state.tts_pool.shutdown(wait=False)
+
+app = FastAPI(
+    title="Healthcare Translation API (Mixtral + Whisper via Together API)",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
-app = FastAPI(title="Healthcare Translation API (Mixtral + Whisper via Together API)")
+MAX_UPLOAD_BYTES = 25_000_000  # Whisper API file limit
+
+# FastAPI parses the multipart form before the endpoint runs, so oversized
+# uploads have to be turned away here, before the body is read. Plain ASGI so
+# every other route passes straight through; registered before CORS so the 413
+# still carries CORS headers.
+class UploadLimitMiddleware:
+    def __init__(self, app, path: str, max_bytes: int):
+        self.app = app
+        self.path = path
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == self.path:
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > self.max_bytes:
+                        response = ORJSONResponse({"error": "Audio file too large."}, status_code=413)
+                        await response(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
+
+app.add_middleware(UploadLimitMiddleware, path="/transcribe", max_bytes=MAX_UPLOAD_BYTES)
 
 app.add_middleware(
     CORSMiddleware,
@@ -40,167 +98,437 @@ app.add_middleware(
 )
 
 os.makedirs("temp", exist_ok=True)
-
-GTTS_LANGS = tts_langs()
-
-LANG_CODE_MAP = {
-    "zh": "zh-CN",
-    "pt": "pt",
-    "he": "iw",
-}
-
-def pick_tts_code(target_lang: str) -> Optional[str]:
-    if target_lang in GTTS_LANGS:
-        return target_lang
-    mapped = LANG_CODE_MAP.get(target_lang)
-    if mapped and mapped in GTTS_LANGS:
-        return mapped
-    return None
-
-def compute_supported_targets() -> List[Dict[str, str]]:
-    supported = [{"code": code, "tts_code": code, "name": name}
-                 for code, name in GTTS_LANGS.items()]
-    supported.sort(key=lambda x: x["code"])
-    return supported
-
-SUPPORTED = compute_supported_targets()
-SUPPORTED_CODES = {item["code"] for item in SUPPORTED}
+TEMP_DIR = os.path.abspath("temp") + os.sep
+
+# ========= Single-flight =========
+# Concurrent callers asking for the same key share one upstream call. The work
+# runs as its own task so a disconnecting caller doesn't cancel it for others.
+INFLIGHT: Dict[object, asyncio.Future] = {}
+
+async def single_flight(key, make: Callable[[], Awaitable]):
+    task = INFLIGHT.get(key)
+    if task is None:
+        task = asyncio.ensure_future(make())
+        INFLIGHT[key] = task
+        task.add_done_callback(lambda _: INFLIGHT.pop(key, None))
+    return await asyncio.shield(task)
+
+# ========= TTS cache =========
+# MP3s are named by a hash of (tts_code, text), so repeated phrases reuse the
+# file already in temp/ instead of calling gTTS again.
+TTS_CACHE_SIZE = 1000
+TTS_TTL_SECONDS = 24 * 60 * 60
+TTS_CLEANUP_INTERVAL = 60 * 60
+
+tts_cache: "OrderedDict[str, float]" = OrderedDict()  # filename -> created_at
+
+# Recent clips are also kept in memory so /get_audio can serve them without
+# touching disk; temp/ is only the fallback once a clip falls out of here.
+AUDIO_CACHE_MAX_BYTES = 200 * 1024 * 1024
+AUDIO_CACHE: "OrderedDict[str, bytes]" = OrderedDict()
+audio_cache_bytes = 0
+
+def cache_audio(filename: str, audio: bytes) -> None:
+    global audio_cache_bytes
+    if filename in AUDIO_CACHE:
+        audio_cache_bytes -= len(AUDIO_CACHE.pop(filename))
+    AUDIO_CACHE[filename] = audio
+    audio_cache_bytes += len(audio)
+    while audio_cache_bytes > AUDIO_CACHE_MAX_BYTES and AUDIO_CACHE:
+        _, evicted = AUDIO_CACHE.popitem(last=False)
+        audio_cache_bytes -= len(evicted)
+
+def uncache_audio(filename: str) -> None:
+    global audio_cache_bytes
+    audio = AUDIO_CACHE.pop(filename, None)
+    if audio is not None:
+        audio_cache_bytes -= len(audio)
+
+async def run_in_tts_pool(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(app.state.tts_pool, fn, *args)
+
+def tts_filename(text: str, tts_code: str) -> str:
+    return hashlib.sha256(f"{tts_code}\0{text}".encode()).hexdigest() + ".mp3"
+
+def remove_tts_file(filename: str) -> None:
+    out_path = TEMP_DIR + filename
+    for path in (out_path, out_path + ".json"):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+# NOTE: tied to gTTS==2.5.4 (pinned in requirements.txt). fetch_tts_audio uses
+# the private gTTS._prepare_requests() and this copy of the response regex from
+# gTTS.stream(); re-check both when upgrading gTTS.
+GTTS_AUDIO = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+
+# Per-process cap on simultaneous Google TTS POSTs, so a long note can't flood
+# Google (429s) or take over the connection pool that Together calls share.
+TTS_FETCH_CONCURRENCY = 8
+
+async def fetch_tts_audio(text: str, tts_code: str) -> bytes:
+    # gTTS.save() fetches each text chunk serially over a fresh requests session.
+    # Reuse gTTS to tokenize and build the requests, but send them concurrently
+    # over the shared keep-alive client and decode the audio the same way gTTS does.
+    prepared = await run_in_tts_pool(lambda: gTTS(text=text, lang=tts_code)._prepare_requests())
+
+    async def fetch(pr) -> bytes:
+        async with app.state.tts_fetch_limit:
+            resp = await app.state.http_client.post(pr.url, content=pr.body, headers=dict(pr.headers))
+        resp.raise_for_status()
+        for line in resp.text.splitlines():
+            if "jQ1olc" in line:
+                match = GTTS_AUDIO.search(line)
+                if match:
+                    return base64.b64decode(match.group(1))
+                break
+        raise RuntimeError("No audio in Google TTS response")
+
+    parts = await asyncio.gather(*(fetch(pr) for pr in prepared))
+    return b"".join(parts)
+
+def write_audio_file(out_path: str, audio: bytes, created_at: float) -> None:
+    part_path = out_path + ".part"
+    with open(part_path, "wb") as f:
+        f.write(audio)
+    os.replace(part_path, out_path)
+    with open(out_path + ".json", "w") as f:
+        # Only the bare filename: the sidecar must not reveal server paths.
+        json.dump({"path": os.path.basename(out_path), "createdAt": created_at, "ttl": TTS_TTL_SECONDS}, f)
+
+async def synthesize_tts(text: str, tts_code: str) -> str:
+    filename = tts_filename(text, tts_code)
+    out_path = TEMP_DIR + filename
+
+    audio = AUDIO_CACHE.get(filename)
+    if audio is not None:
+        AUDIO_CACHE.move_to_end(filename)
+        if not os.path.exists(out_path):
+            # Another worker's LRU removed the file; put it back from memory
+            # so the URL resolves on every process.
+            await store_tts_file(filename, out_path, audio)
+        return filename
+
+    async with app.state.tts_cache_lock:
+        if os.path.exists(out_path):
+            tts_cache.setdefault(filename, time.time())
+            tts_cache.move_to_end(filename)
+            return filename
+
+    return await single_flight(filename, lambda: synthesize_tts_uncached(text, tts_code, filename, out_path))
+
+async def synthesize_tts_uncached(text: str, tts_code: str, filename: str, out_path: str) -> str:
+    audio = await fetch_tts_audio(text, tts_code)
+    cache_audio(filename, audio)
+    await store_tts_file(filename, out_path, audio)
+    return filename
+
+async def store_tts_file(filename: str, out_path: str, audio: bytes) -> None:
+    # Playback is served from memory, but the file must be on disk before we
+    # hand out the URL: with several workers, /get_audio may land on a process
+    # that doesn't have the clip cached. write_audio_file goes through a side
+    # file so a concurrent request never sees a half-written MP3 as a cache hit.
+    created_at = time.time()
+    await run_in_tts_pool(write_audio_file, out_path, audio, created_at)
+
+    async with app.state.tts_cache_lock:
+        tts_cache[filename] = created_at
+        tts_cache.move_to_end(filename)
+        while len(tts_cache) > TTS_CACHE_SIZE:
+            evicted, _ = tts_cache.popitem(last=False)
+            uncache_audio(evicted)
+            remove_tts_file(evicted)
+
+def find_expired_tts_files(now: float) -> List[str]:
+    expired = []
+    for name in os.listdir(TEMP_DIR):
+        if not name.endswith(".mp3.json"):
+            continue
+        try:
+            with open(TEMP_DIR + name) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if now - meta.get("createdAt", now) > meta.get("ttl", TTS_TTL_SECONDS):
+            expired.append(name[:-len(".json")])
+    return expired
+
+def remove_tts_files(filenames: List[str]) -> None:
+    for filename in filenames:
+        remove_tts_file(filename)
+
+async def tts_cleanup_loop() -> None:
+    while True:
+        # The directory scan runs in the TTS pool without the lock, so
+        # synthesize_tts isn't held up for the length of the sweep.
+        expired = await run_in_tts_pool(find_expired_tts_files, time.time())
+        if expired:
+            # Deleting under the lock keeps the on-disk cache check in
+            # synthesize_tts from handing out a URL whose file is going away.
+            async with app.state.tts_cache_lock:
+                for filename in expired:
+                    tts_cache.pop(filename, None)
+                    uncache_audio(filename)
+                await run_in_tts_pool(remove_tts_files, expired)
+        await asyncio.sleep(TTS_CLEANUP_INTERVAL)
 
 class TranslateTTSRequest(BaseModel):
     text: str
     target_lang: str
     source_lang: Optional[str] = "auto"
 
-def code_to_lang_name(code: str) -> str:
-    if code in GTTS_LANGS:
-        return GTTS_LANGS[code]
-    mapped = LANG_CODE_MAP.get(code)
-    if mapped and mapped in GTTS_LANGS:
-        return GTTS_LANGS[mapped]
-    return code
-
-def mistral_translate_together(text: str, target_code: str, source_code: Optional[str] = "auto") -> str:
-    if not TOGETHER_API_KEY:
-        raise RuntimeError("Missing TOGETHER_API_KEY")
-
-    target_name = code_to_lang_name(target_code)
-    src_desc = "auto-detect the source language accurately" if source_code in (None, "", "auto") \
-               else f"the source language is '{code_to_lang_name(source_code)}'"
-
-    prompt = (
-        f"You are a professional medical translator.\n"
-        f"Task: Translate the given text into **{target_name}**.\n"
-        f"- Detect and handle medical terminology precisely.\n"
-        f"- Preserve meaning, tone, and clinical nuance.\n"
-        f"- {src_desc}.\n"
-        f"- Output ONLY the translated text, no extra words.\n\n"
-        f"Text:\n'''{text}'''"
-    )
+# ========= Translation cache =========
+TRANSLATION_CACHE_SIZE = 10_000
+TRANSLATION_CACHE: "OrderedDict[bytes, str]" = OrderedDict()
 
-    headers = {
-        "Authorization": f"Bearer {TOGETHER_API_KEY}",
-        "Content-Type": "application/json",
-    }
-
-    payload = {
-        "model": MODEL_NAME,
-        "messages": [
-            {"role": "system", "content": "You are a highly skilled professional medical translator."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 400,
-        "temperature": 0.2,
-    }
-
-    resp = requests.post(API_URL, headers=headers, json=payload, timeout=60)
-    if resp.status_code >= 400:
-        raise RuntimeError(f"Together API error {resp.status_code}: {resp.text}")
-
-    data = resp.json()
-    try:
-        return data["choices"][0]["message"]["content"].strip()
-    except (KeyError, IndexError):
-        raise RuntimeError("Invalid response from Together API")
+def translation_cache_key(text: str, target_code: str, source_code: Optional[str]) -> bytes:
+    return hashlib.blake2b(f"{source_code}\0{target_code}\0{text}".encode(), digest_size=16).digest()
+
+async def translate_text(text: str, target_code: str, source_code: Optional[str] = "auto") -> str:
+    key = translation_cache_key(text, target_code, source_code)
+    cached = TRANSLATION_CACHE.get(key)
+    if cached is not None:
+        TRANSLATION_CACHE.move_to_end(key)
+        return cached
+
+    return await single_flight(key, lambda: translate_uncached(key, text, target_code, source_code))
+
+async def translate_uncached(key: bytes, text: str, target_code: str, source_code: Optional[str]) -> str:
+    translated = await translators.translate(text, target_code, source_code)
+    cache_translation(key, translated)
+    return translated
+
+def cache_translation(key: bytes, translated: str) -> None:
+    if translated:
+        TRANSLATION_CACHE[key] = translated
+        if len(TRANSLATION_CACHE) > TRANSLATION_CACHE_SIZE:
+            TRANSLATION_CACHE.popitem(last=False)
 
 @app.get("/")
 def root():
     return {"message": "Healthcare Translation API (Mixtral + Whisper via Together API) is running"}
 
-@app.get("/languages")
+@app.get("/languages", response_model=None)
 def languages():
-    return {"languages": SUPPORTED}
-
-@app.post("/translate_tts")
-def translate_tts(payload: TranslateTTSRequest):
-    text = (payload.text or "").strip()
-    target = (payload.target_lang or "").strip()
-    source = (payload.source_lang or "auto").strip().lower()
-
+    # Language list is fixed at import; serve the pre-serialized body.
+    return Response(ORJSON_LANGS, media_type="application/json")
+
+SENTENCE_END = re.compile(r"(?<=[.?!])\s+")
+PARAGRAPH_SPLIT = re.compile(r"(\n\s*\n)")  # keeps the separators
+SHARD_CHARS = 1000
+MAX_SHARD_CONCURRENCY = 8
+
+def shard_paragraphs(text: str) -> Tuple[List[str], List[str]]:
+    # Pack whole paragraphs into shards of up to SHARD_CHARS. Never splitting
+    # inside a paragraph keeps abbreviations ("5 mg.", "Dr.") and numbered
+    # lists together with their context.
+    parts = PARAGRAPH_SPLIT.split(text)
+    shards, separators = [parts[0]], []
+    for separator, paragraph in zip(parts[1::2], parts[2::2]):
+        if len(shards[-1]) + len(separator) + len(paragraph) <= SHARD_CHARS:
+            shards[-1] += separator + paragraph
+        else:
+            separators.append(separator)
+            shards.append(paragraph)
+    return shards, separators
+
+async def translate_sharded(text: str, target_code: str, source_code: Optional[str]) -> str:
+    # Long inputs are translated a few paragraphs at a time in parallel; with
+    # the Together backend, concurrent shards are coalesced by its batcher.
+    shards, separators = shard_paragraphs(text)
+    if len(shards) <= 1:
+        return await translate_text(text, target_code, source_code)
+
+    semaphore = asyncio.Semaphore(MAX_SHARD_CONCURRENCY)
+
+    async def translate_one(shard: str) -> str:
+        async with semaphore:
+            return await translate_text(shard, target_code, source_code)
+
+    translated = await asyncio.gather(*(translate_one(shard) for shard in shards))
+
+    result = translated[0]
+    for separator, shard in zip(separators, translated[1:]):
+        result += separator + shard
+    return result.strip()
+
+def validate_translate_request(text: str, target: str) -> Optional[ORJSONResponse]:
     if not text:
-        return JSONResponse({"error": "Text is empty."}, status_code=400)
+        return ORJSONResponse({"error": "Text is empty."}, status_code=400)
 
     if target not in SUPPORTED_CODES:
-        return JSONResponse({
+        return ORJSONResponse({
             "error": f"Target language '{target}' not supported for TTS.",
             "hint": "Use GET /languages for supported codes."
         }, status_code=400)
 
+    if not pick_tts_code(target):
+        return ORJSONResponse({
+            "error": f"No TTS voice available for '{target}'."
+        }, status_code=400)
+    return None
+
+@app.post("/translate_tts", response_model=None, response_class=ORJSONResponse)
+async def translate_tts(payload: TranslateTTSRequest):
+    text = (payload.text or "").strip()
+    target = (payload.target_lang or "").strip()
+    source = normalize_source(payload.source_lang)
+
+    error = validate_translate_request(text, target)
+    if error:
+        return error
+
     try:
-        translated_text = mistral_translate_together(text, target, source)
+        translated_text = await translate_sharded(text, target, source)
         if not translated_text:
             raise RuntimeError("Empty translation")
+    except CircuitOpenError as e:
+        return ORJSONResponse({"error": f"Translation failed: {e}"}, status_code=503)
     except Exception as e:
-        return JSONResponse({"error": f"Translation failed: {e}"}, status_code=502)
-
-    tts_code = pick_tts_code(target)
-    if not tts_code:
-        return JSONResponse({
-            "error": f"No TTS voice available for '{target}'."
-        }, status_code=400)
+        return ORJSONResponse({"error": f"Translation failed: {e}"}, status_code=502)
 
     try:
-        filename = f"{uuid.uuid4()}.mp3"
-        out_path = os.path.join("temp", filename)
-        gTTS(text=translated_text, lang=tts_code).save(out_path)
+        filename = await synthesize_tts(translated_text, pick_tts_code(target))
     except Exception as e:
-        return JSONResponse({"error": f"TTS failed: {e}"}, status_code=502)
+        return ORJSONResponse({"error": f"TTS failed: {e}"}, status_code=502)
 
-    return {
+    # Return the response object directly so FastAPI skips jsonable_encoder.
+    return ORJSONResponse({
         "original_text": text,
         "translated_text": translated_text,
         "target_lang": target,
         "audio_url": f"/get_audio/{filename}"
-    }
+    })
+
+def sse(event: dict) -> str:
+    return f"data: {orjson.dumps(event).decode()}\n\n"
+
+async def iter_once(value: str) -> AsyncIterator[str]:
+    yield value
+
+@app.post("/translate_tts_stream")
+async def translate_tts_stream(payload: TranslateTTSRequest):
+    """Streams translation tokens as SSE and synthesizes audio sentence by sentence."""
+    text = (payload.text or "").strip()
+    target = (payload.target_lang or "").strip()
+    source = normalize_source(payload.source_lang)
+
+    error = validate_translate_request(text, target)
+    if error:
+        return error
+
+    tts_code = pick_tts_code(target)
+
+    async def events() -> AsyncIterator[str]:
+        tts_tasks: List[asyncio.Task] = []
+        emitted = 0
+
+        def start_tts(sentence: str) -> None:
+            tts_tasks.append(asyncio.create_task(synthesize_tts(sentence, tts_code)))
+
+        async def finished_audio(wait: bool) -> AsyncIterator[str]:
+            # Emit clips in sentence order as soon as each one (and all before it) is ready.
+            nonlocal emitted
+            while emitted < len(tts_tasks):
+                task = tts_tasks[emitted]
+                if not wait and not task.done():
+                    return
+                try:
+                    filename = await task
+                    yield sse({"index": emitted, "audio_url": f"/get_audio/{filename}"})
+                except Exception as e:
+                    yield sse({"index": emitted, "error": f"TTS failed: {e}"})
+                emitted += 1
+
+        key = translation_cache_key(text, target, source)
+        cached = TRANSLATION_CACHE.get(key)
+        chunks: List[str] = []
+        buffer = ""
+        try:
+            if cached is not None:
+                tokens: AsyncIterator[str] = iter_once(cached)
+            else:
+                tokens = translators.stream(text, target, source)
+            async for delta in tokens:
+                chunks.append(delta)
+                buffer += delta
+                yield sse({"token": delta})
+                *sentences, buffer = SENTENCE_END.split(buffer)
+                for sentence in sentences:
+                    if sentence.strip():
+                        start_tts(sentence.strip())
+                async for event in finished_audio(wait=False):
+                    yield event
+        except Exception as e:
+            for task in tts_tasks:
+                task.cancel()
+            yield sse({"error": f"Translation failed: {e}"})
+            return
+
+        if buffer.strip():
+            start_tts(buffer.strip())
+        async for event in finished_audio(wait=True):
+            yield event
+
+        translated_text = "".join(chunks).strip()
+        cache_translation(key, translated_text)
+        yield sse({"done": True, "translated_text": translated_text, "target_lang": target})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+# Filenames are content hashes, so a given URL always maps to the same audio.
+AUDIO_HEADERS = {"Cache-Control": "public, max-age=86400"}
+
+# Only content-hashed clips are served; sidecars and anything else in temp/ are not.
+AUDIO_FILENAME = re.compile(r"[0-9a-f]{64}\.mp3")
 
 @app.get("/get_audio/{filename}")
-def get_audio(filename: str):
-    file_path = os.path.join("temp", filename)
+async def get_audio(filename: str):
+    if not AUDIO_FILENAME.fullmatch(filename):
+        return ORJSONResponse({"error": "File not found."}, status_code=404)
+
+    audio = AUDIO_CACHE.get(filename)
+    if audio is not None:
+        AUDIO_CACHE.move_to_end(filename)
+        return Response(content=audio, media_type="audio/mpeg", headers=AUDIO_HEADERS)
+
+    file_path = TEMP_DIR + filename
     if not os.path.exists(file_path):
-        return JSONResponse({"error": "File not found."}, status_code=404)
-    return FileResponse(file_path, media_type="audio/mpeg")
+        return ORJSONResponse({"error": "File not found."}, status_code=404)
+    return FileResponse(file_path, media_type="audio/mpeg", headers=AUDIO_HEADERS)
 
-@app.post("/transcribe")
+@app.post("/transcribe", response_model=None, response_class=ORJSONResponse)
 async def transcribe(file: UploadFile = File(...)):
     if not OPENAI_API_KEY:
-        return JSONResponse({"error": "Missing OPENAI_API_KEY"}, status_code=500)
-
-    content = await file.read()
-    suffix = os.path.splitext(file.filename or "")[1] or ".mp3"
+        return ORJSONResponse({"error": "Missing OPENAI_API_KEY"}, status_code=500)
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        tmp.write(content)
-        tmp_path = tmp.name
+    # Chunked uploads carry no Content-Length; check the spooled size as well.
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        return ORJSONResponse({"error": "Audio file too large."}, status_code=413)
 
     try:
-        with open(tmp_path, "rb") as f:
-            resp = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=f
-            )
+        # Hand Starlette's spooled upload straight to the SDK; no extra copy in RAM or on disk.
+        resp = await app.state.openai.audio.transcriptions.create(
+            model="whisper-1",
+            file=(file.filename or "audio.mp3", file.file, file.content_type),
+        )
         text = resp.text if hasattr(resp, "text") else str(resp)
     except Exception as e:
-        os.remove(tmp_path)
-        return JSONResponse({"error": f"Transcription failed: {e}"}, status_code=502)
-
-    os.remove(tmp_path)
-    return {"text": text}
+        return ORJSONResponse({"error": f"Transcription failed: {e}"}, status_code=502)
+
+    return ORJSONResponse({"text": text})
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # One worker per core, each with its own event loop, clients and caches.
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "127.0.0.1"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        loop="uvloop",
+        http="httptools",
+        backlog=2048,
+    )
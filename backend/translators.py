@@ -0,0 +1,371 @@
+from typing import Optional, List, Dict, AsyncIterator, Awaitable, Callable
+import os
+import json
+import time
+import asyncio
+import itertools
+import httpx
+from dotenv import load_dotenv
+
+from languages import code_to_lang_name, RESOLVER
+
+# ========= Setup =========
+load_dotenv()
+
+TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY", "").strip()
+API_URL = "https://api.together.xyz/v1/chat/completions"
+MODEL_NAME = "mistralai/Mixtral-8x7B-Instruct-v0.1"
+
+# Invariant instructions go first so Together's prefix cache can reuse them
+# across requests; only the short user message varies.
+SYSTEM_PROMPT = (
+    "You are a highly skilled professional medical translator.\n"
+    "- Translate the user's text into the requested target language.\n"
+    "- Detect and handle medical terminology precisely.\n"
+    "- Preserve meaning, tone, and clinical nuance.\n"
+    "- Output ONLY the translated text, no extra words."
+)
+
+# Batched calls need their own instructions: the reply is a JSON array, not bare text.
+BATCH_SYSTEM_PROMPT = (
+    "You are a highly skilled professional medical translator.\n"
+    "- The user gives a JSON array of strings; translate each string into the requested target language.\n"
+    "- Detect and handle medical terminology precisely.\n"
+    "- Preserve meaning, tone, and clinical nuance.\n"
+    "- Output ONLY a JSON array with exactly one translated string per input string, in the same order. No extra words."
+)
+
+# Prompt templates are built once; per call only the variable fields are filled in.
+AUTO_SOURCE_DESC = "auto-detect the source language accurately"
+SOURCE_DESC_TMPL = "the source language is '{}'".format
+TRANSLATE_PROMPT_TMPL = "Target language: {target_name}. Note: {src_desc}.\n\nText:\n'''{text}'''".format
+BATCH_PROMPT_TMPL = (
+    "Translate each string in this JSON array to {target_name}. Note: {src_desc}. "
+    "Reply with a JSON array of exactly {count} strings, same order.\n\n{items}"
+).format
+
+TOGETHER_HEADERS = {
+    "Authorization": f"Bearer {TOGETHER_API_KEY}",
+    "Content-Type": "application/json",
+}
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+BATCH_SYSTEM_MESSAGE = {"role": "system", "content": BATCH_SYSTEM_PROMPT}
+
+def describe_source(source_code: Optional[str]) -> str:
+    if source_code in (None, "", "auto"):
+        return AUTO_SOURCE_DESC
+    return SOURCE_DESC_TMPL(code_to_lang_name(source_code))
+
+def translation_prompt(text: str, target_code: str, source_code: Optional[str]) -> str:
+    return TRANSLATE_PROMPT_TMPL(
+        target_name=code_to_lang_name(target_code),
+        src_desc=describe_source(source_code),
+        text=text,
+    )
+
+# ========= Circuit breaker =========
+class CircuitOpenError(RuntimeError):
+    pass
+
+class UpstreamError(RuntimeError):
+    """The upstream service itself failed (5xx or 429), as opposed to rejecting one request."""
+
+def raise_for_upstream(service: str, status_code: int, body: str) -> None:
+    if status_code >= 500 or status_code == 429:
+        raise UpstreamError(f"{service} error {status_code}: {body}")
+    if status_code >= 400:
+        raise RuntimeError(f"{service} error {status_code}: {body}")
+
+class CircuitBreaker:
+    """Fails fast after repeated upstream errors instead of letting every request wait on a timeout."""
+
+    # Only outages count: transport errors (incl. timeouts) and 5xx/429. A 4xx
+    # or a malformed reply caused by one request's input must not lock out everyone.
+    FAILURES = (httpx.TransportError, UpstreamError)
+
+    def __init__(self, name: str, fail_max: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    def check(self) -> None:
+        # After reset_timeout the breaker lets calls through again; one more
+        # failure re-opens it straight away since the count is still at fail_max.
+        if self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_timeout:
+            raise CircuitOpenError(f"{self.name} is unavailable, try again shortly")
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self, exc: Exception) -> None:
+        if not isinstance(exc, self.FAILURES):
+            return
+        self.failures += 1
+        if self.failures >= self.fail_max:
+            self.opened_at = time.monotonic()
+
+    async def call(self, fn: Callable[..., Awaitable], *args):
+        self.check()
+        try:
+            result = await fn(*args)
+        except Exception as e:
+            self.failure(e)
+            raise
+        self.success()
+        return result
+
+# ========= Request batching =========
+class TranslationBatcher:
+    """Coalesces concurrent translations for the same language pair into one upstream call."""
+
+    def __init__(self, translate_one: Callable[..., Awaitable[str]],
+                 translate_many: Callable[..., Awaitable[List[str]]],
+                 max_batch: int = 8, max_wait: float = 0.025, idle_timeout: float = 60):
+        self.translate_one = translate_one
+        self.translate_many = translate_many
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.idle_timeout = idle_timeout
+        self.queues: Dict[tuple, asyncio.Queue] = {}
+        self.workers: Dict[tuple, asyncio.Task] = {}
+        self.inflight: set = set()  # strong refs so dispatch tasks aren't GC'd
+
+    async def submit(self, text: str, target_code: str, source_code: Optional[str]) -> str:
+        bucket = (source_code, target_code)
+        if bucket not in self.queues:
+            self.queues[bucket] = asyncio.Queue()
+            self.workers[bucket] = asyncio.create_task(self._run(bucket))
+        future = asyncio.get_running_loop().create_future()
+        self.queues[bucket].put_nowait((text, future))
+        return await future
+
+    async def _run(self, bucket: tuple) -> None:
+        source_code, target_code = bucket
+        queue = self.queues[bucket]
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                first = await asyncio.wait_for(queue.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                # Retire idle buckets so rarely used language pairs don't keep a task forever.
+                if queue.empty():
+                    del self.queues[bucket]
+                    del self.workers[bucket]
+                    return
+                continue
+            batch = [first]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self._dispatch(batch, target_code, source_code))
+            self.inflight.add(task)
+            task.add_done_callback(self.inflight.discard)
+
+    async def _dispatch(self, batch: list, target_code: str, source_code: Optional[str]) -> None:
+        texts = [text for text, _ in batch]
+        try:
+            if len(texts) == 1:
+                results = [await self.translate_one(texts[0], target_code, source_code)]
+            else:
+                results = await self.translate_many(texts, target_code, source_code)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def close(self) -> None:
+        for task in self.workers.values():
+            task.cancel()
+        # Forget the cancelled workers so a later start() spawns fresh ones.
+        self.workers.clear()
+        self.queues.clear()
+
+# ========= Backends =========
+class TogetherBackend:
+    """Mixtral via the Together chat-completions API, with micro-batching and streaming."""
+
+    def __init__(self):
+        self.client: Optional[httpx.AsyncClient] = None
+        self.breaker = CircuitBreaker("Together API")
+        self.batcher = TranslationBatcher(self.translate_one, self.translate_many)
+        if not TOGETHER_API_KEY:
+            print("WARNING: TOGETHER_API_KEY not set in .env file")
+
+    async def start(self, http_client: httpx.AsyncClient) -> None:
+        self.client = http_client
+
+    async def close(self) -> None:
+        self.batcher.close()
+
+    async def translate(self, text: str, target_code: str, source_code: Optional[str]) -> str:
+        if not TOGETHER_API_KEY:
+            raise RuntimeError("Missing TOGETHER_API_KEY")
+        return await self.batcher.submit(text, target_code, source_code)
+
+    def payload(self, prompt: str, max_tokens: int = 400, stream: bool = False,
+                system_message: dict = SYSTEM_MESSAGE) -> dict:
+        return {
+            "model": MODEL_NAME,
+            "messages": [
+                system_message,
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": max_tokens,
+            "temperature": 0.2,
+            "stream": stream,
+        }
+
+    async def chat(self, prompt: str, max_tokens: int = 400, system_message: dict = SYSTEM_MESSAGE) -> str:
+        return await self.breaker.call(self.chat_once, prompt, max_tokens, system_message)
+
+    async def chat_once(self, prompt: str, max_tokens: int, system_message: dict) -> str:
+        payload = self.payload(prompt, max_tokens, system_message=system_message)
+        resp = await self.client.post(API_URL, headers=TOGETHER_HEADERS, json=payload)
+        raise_for_upstream("Together API", resp.status_code, resp.text)
+
+        data = resp.json()
+        try:
+            return data["choices"][0]["message"]["content"].strip()
+        except (KeyError, IndexError):
+            raise RuntimeError("Invalid response from Together API")
+
+    async def stream(self, text: str, target_code: str, source_code: Optional[str]) -> AsyncIterator[str]:
+        if not TOGETHER_API_KEY:
+            raise RuntimeError("Missing TOGETHER_API_KEY")
+        self.breaker.check()
+        payload = self.payload(translation_prompt(text, target_code, source_code), stream=True)
+        try:
+            async with self.client.stream("POST", API_URL, headers=TOGETHER_HEADERS, json=payload) as resp:
+                if resp.status_code >= 400:
+                    body = await resp.aread()
+                    raise_for_upstream("Together API", resp.status_code, body.decode(errors="replace"))
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    except (ValueError, KeyError, IndexError):
+                        continue
+                    if delta:
+                        yield delta
+        except Exception as e:
+            self.breaker.failure(e)
+            raise
+        self.breaker.success()
+
+    async def translate_one(self, text: str, target_code: str, source_code: Optional[str]) -> str:
+        return await self.chat(translation_prompt(text, target_code, source_code))
+
+    async def translate_many(self, texts: List[str], target_code: str, source_code: Optional[str]) -> List[str]:
+        # JSON-encode the items so newlines or "N." numbering inside one caller's
+        # text can't shift the item boundaries between callers.
+        prompt = BATCH_PROMPT_TMPL(
+            target_name=code_to_lang_name(target_code),
+            src_desc=describe_source(source_code),
+            count=len(texts),
+            items=json.dumps(texts, ensure_ascii=False),
+        )
+        content = await self.chat(prompt, max_tokens=400 * len(texts), system_message=BATCH_SYSTEM_MESSAGE)
+        try:
+            translations = json.loads(content[content.index("["):content.rindex("]") + 1])
+        except ValueError:
+            translations = None
+        if not isinstance(translations, list) or len(translations) != len(texts) \
+                or not all(isinstance(t, str) for t in translations):
+            # Model didn't follow the batch format; translate items one by one.
+            return list(await asyncio.gather(
+                *(self.translate_one(t, target_code, source_code) for t in texts)
+            ))
+        return [t.strip() for t in translations]
+
+class GoogletransBackend:
+    """Google Translate via googletrans 4.x, spread over a small pool of clients."""
+
+    def __init__(self, pool_size: int = 8, timeout: float = 10):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.translators: list = []
+        self.pool = None
+        self.codes: Dict[str, str] = {}
+        self.breaker = CircuitBreaker("Google Translate")
+
+    async def start(self, http_client: httpx.AsyncClient) -> None:
+        # googletrans manages its own httpx clients; round-robin across several
+        # so concurrent requests don't queue behind a single connection.
+        from googletrans import Translator
+        from googletrans.constants import LANGUAGES
+
+        # raise_exception=True: by default googletrans answers a non-200 reply by
+        # returning the source text as the "translation".
+        self.translators = [
+            Translator(timeout=httpx.Timeout(self.timeout), raise_exception=True)
+            for _ in range(self.pool_size)
+        ]
+        self.pool = itertools.cycle(self.translators)
+
+        # Map our codes to ones googletrans accepts: the gTTS code lowercased
+        # (zh-CN -> zh-cn), else the base language (fr-CA -> fr).
+        for code, (tts_code, _) in RESOLVER.items():
+            for candidate in (tts_code.lower(), code.lower(), code.split("-")[0].lower()):
+                if candidate in LANGUAGES:
+                    self.codes[code] = candidate
+                    break
+
+    async def close(self) -> None:
+        for translator in self.translators:
+            await translator.client.aclose()
+
+    async def translate(self, text: str, target_code: str, source_code: Optional[str]) -> str:
+        # Resolve codes before the breaker so a bad language never counts as an upstream failure.
+        dest = self.codes.get(target_code)
+        if dest is None:
+            raise ValueError(f"Target language '{target_code}' is not supported by Google Translate")
+        # Unknown source codes fall back to auto-detection.
+        src = self.codes.get(source_code, "auto")
+        return await self.breaker.call(self.translate_once, text, dest, src)
+
+    async def translate_once(self, text: str, dest: str, src: str) -> str:
+        try:
+            result = await next(self.pool).translate(text, dest, src)
+        except Exception as e:
+            # googletrans reports non-200 replies (429s, 5xx) as a bare Exception.
+            if type(e) is Exception:
+                raise UpstreamError(f"Google Translate error: {e}") from e
+            raise
+        return result.text
+
+    async def stream(self, text: str, target_code: str, source_code: Optional[str]) -> AsyncIterator[str]:
+        # googletrans has no token stream; emit the whole translation at once.
+        yield await self.translate(text, target_code, source_code)
+
+BACKENDS = {
+    "together": TogetherBackend,
+    "googletrans": GoogletransBackend,
+}
+
+BACKEND_NAME = os.getenv("TRANSLATOR", "together").strip().lower()
+if BACKEND_NAME not in BACKENDS:
+    raise RuntimeError(f"Unknown TRANSLATOR '{BACKEND_NAME}', expected one of: {', '.join(BACKENDS)}")
+BACKEND = BACKENDS[BACKEND_NAME]()
+
+async def translate(text: str, target_code: str, source_code: Optional[str] = "auto") -> str:
+    return await BACKEND.translate(text, target_code, source_code)
+
+def stream(text: str, target_code: str, source_code: Optional[str] = "auto") -> AsyncIterator[str]:
+    return BACKEND.stream(text, target_code, source_code)